@@ -0,0 +1,49 @@
+import os
+import sys
+from logging.config import fileConfig
+
+from alembic import context
+from sqlalchemy import create_engine, pool
+
+# Код приложения импортируется так же, как при запуске с PYTHONPATH=src
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from core.config import settings  # noqa: E402
+from models.complaint_model import Base  # noqa: E402
+
+config = context.config
+
+if config.config_file_name is not None:
+    fileConfig(config.config_file_name)
+
+target_metadata = Base.metadata
+
+
+def run_migrations_offline() -> None:
+    context.configure(
+        url=settings.db_settings.sync_uri,
+        target_metadata=target_metadata,
+        literal_binds=True,
+        dialect_opts={"paramstyle": "named"},
+        render_as_batch=True,
+    )
+
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_migrations_online() -> None:
+    connectable = create_engine(settings.db_settings.sync_uri, poolclass=pool.NullPool)
+
+    with connectable.connect() as connection:
+        # SQLite не умеет ALTER большинства конструкций, поэтому миграции идут в batch режиме
+        context.configure(connection=connection, target_metadata=target_metadata, render_as_batch=True)
+
+        with context.begin_transaction():
+            context.run_migrations()
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
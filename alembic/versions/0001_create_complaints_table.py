@@ -0,0 +1,36 @@
+"""create complaints table
+
+Revision ID: 0001
+Revises: 
+Create Date: 2026-10-14 19:18:12.867105
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = '0001'
+down_revision: Union[str, Sequence[str], None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'complaints',
+        sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('text', sa.Text(), nullable=False),
+        sa.Column('status', sa.Enum('open', 'closed'), nullable=True),
+        sa.Column('timestamp', sa.DateTime(), nullable=True),
+        sa.Column('sentiment', sa.String(length=20), nullable=True, comment='positive/negative/neutral/unknown'),
+        sa.Column('category', sa.String(length=20), nullable=True, comment='техническая/оплата/другое'),
+        sa.Column('is_spam', sa.Boolean(), nullable=True),
+        sa.Column('ip_location', sa.String(length=100), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('complaints')
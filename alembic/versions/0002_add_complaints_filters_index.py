@@ -0,0 +1,32 @@
+"""add complaints filters index
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-14 21:05:41.302518
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = '0002'
+down_revision: Union[str, Sequence[str], None] = '0001'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # В базах, созданных через create_all в режиме DEBUG, индекс уже может быть
+    op.create_index(
+        'ix_complaints_filters',
+        'complaints',
+        ['status', 'category', 'sentiment', sa.literal_column('timestamp DESC')],
+        unique=False,
+        if_not_exists=True
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_complaints_filters', table_name='complaints')
@@ -1,6 +1,10 @@
+import itertools
 from typing import List, Optional
 
-from fastapi import Depends, APIRouter, Request, Query
+import orjson
+from cachetools import TTLCache
+from fastapi import Depends, APIRouter, Query
+from fastapi.responses import ORJSONResponse, Response
 from starlette import status
 
 from api.dto.complaints_dto import (
@@ -10,12 +14,22 @@ from api.dto.complaints_dto import (
     ComplaintStatusUpdate
 )
 from api.services.complaints_service import ComplaintsService, get_complaints_service
+from middleware.geo_middleware import get_client_location
 
 router = APIRouter(
     prefix="/complaints",
-    tags=["Обработка жалоб"]
+    tags=["Обработка жалоб"],
+    default_response_class=ORJSONResponse
 )
 
+# Готовые JSON-ответы для закрытых жалоб: они не меняются, пока статус не обновят
+_CLOSED_COMPLAINT_CACHE: TTLCache = TTLCache(maxsize=10_000, ttl=300)
+# Версия жалобы меняется при каждой смене статуса, чтобы GET не закэшировал устаревший ответ.
+# Кэш ограничен (id приходят от клиента) и живет дольше закэшированных ответов;
+# версии берутся из общего счетчика, поэтому после вытеснения записи значение не повторится
+_COMPLAINT_VERSIONS: TTLCache = TTLCache(maxsize=100_000, ttl=600)
+_VERSION_COUNTER = itertools.count(1)
+
 
 @router.post(
     "",
@@ -26,17 +40,20 @@ router = APIRouter(
 )
 async def create_complaint(
         complaint: ComplaintCreate,
-        request: Request,
+        client_location: Optional[str] = Depends(get_client_location),
         service: ComplaintsService = Depends(get_complaints_service)
 ) -> ComplaintResponse:
     """
     Создание новой жалобы с полной обработкой:
     - Анализ тональности через APILayer
-    - Проверка на спам (Через background задачи)
+    - Проверка на спам
     - Определение геолокации по IP
-    - Категоризация через OpenAI (асинхронно)
+    - Категоризация через OpenAI
+
+    Анализ тональности, проверка на спам и категоризация выполняются параллельно.
     """
-    return await service.create_complaint_service(complaint, request)
+    # Геолокация запускается в middleware и дожидается зависимостью get_client_location
+    return await service.create_complaint_service(complaint, client_location)
 
 
 @router.get(
@@ -53,12 +70,12 @@ async def get_complaints(
         limit: int = Query(20, description="Лимит результатов", ge=1, le=100),
         offset: int = Query(0, description="Смещение для пагинации", ge=0),
         service: ComplaintsService = Depends(get_complaints_service)
-) -> ComplaintList:
+) -> ORJSONResponse:
     """
     Получение списка жалоб с фильтрацией.
     Используется n8n для автоматизации workflow.
     """
-    return await service.get_complaints_list(
+    complaint_list = await service.get_complaints_list(
         status=status,
         since_hours=since_hours,
         category=category,
@@ -67,6 +84,9 @@ async def get_complaints(
         offset=offset
     )
 
+    # Отдаем готовый dict напрямую в orjson, минуя повторную обработку через response_model
+    return ORJSONResponse(content=complaint_list.model_dump())
+
 
 @router.get(
     "/{complaint_id}",
@@ -77,9 +97,21 @@ async def get_complaints(
 async def get_complaint(
         complaint_id: int,
         service: ComplaintsService = Depends(get_complaints_service)
-) -> ComplaintResponse:
+) -> Response:
     """Получение конкретной жалобы по ID"""
-    return await service.get_complaint_by_id(complaint_id)
+    cached_body = _CLOSED_COMPLAINT_CACHE.get(complaint_id)
+    if cached_body is not None:
+        return Response(content=cached_body, media_type="application/json")
+
+    version = _COMPLAINT_VERSIONS.get(complaint_id, 0)
+    complaint = await service.get_complaint_by_id(complaint_id)
+    body = orjson.dumps(complaint.model_dump(include=set(ComplaintResponse.model_fields)))
+
+    # Пока читали из БД, статус могли изменить - такой ответ в кэш не кладем
+    if complaint.status == "closed" and _COMPLAINT_VERSIONS.get(complaint_id, 0) == version:
+        _CLOSED_COMPLAINT_CACHE[complaint_id] = body
+
+    return Response(content=body, media_type="application/json")
 
 
 @router.patch(
@@ -96,7 +128,14 @@ async def update_complaint_status(
     Обновление статуса жалобы.
     Используется n8n workflow для автоматического закрытия обработанных жалоб.
     """
-    return await service.update_complaint_status(complaint_id, status_update.status)
+    _COMPLAINT_VERSIONS[complaint_id] = next(_VERSION_COUNTER)
+    try:
+        result = await service.update_complaint_status(complaint_id, status_update.status)
+    finally:
+        # Вытеснение после UPDATE: GET, прочитавший версию до PATCH, мог успеть записать старое тело
+        _COMPLAINT_VERSIONS[complaint_id] = next(_VERSION_COUNTER)
+        _CLOSED_COMPLAINT_CACHE.pop(complaint_id, None)
+    return result
 
 
 @router.get(
@@ -1,24 +1,21 @@
-from pydantic import BaseModel, Field, field_validator
+from pydantic import BaseModel, ConfigDict, Field, StringConstraints
 from datetime import datetime
-from typing import Optional, List, Dict, Any
+from typing import Annotated, Optional, List, Dict, Any, Literal
+
+ComplaintStatus = Literal["open", "closed"]
+ComplaintCategory = Literal["техническая", "оплата", "другое"]
+ComplaintSentiment = Literal["positive", "negative", "neutral", "unknown"]
 
 
 class ComplaintCreate(BaseModel):
-    text: str = Field(
+    # Обрезка пробелов и проверка длины выполняются в pydantic-core
+    text: Annotated[str, StringConstraints(strip_whitespace=True, min_length=1, max_length=2000)] = Field(
         ...,
-        max_length=2000,
         description="Текст жалобы клиента",
         examples=["Не приходит SMS-код для входа в приложение"]
     )
 
-
-    @field_validator('text')
-    @classmethod
-    def validate_text(cls, v: str) -> str:
-        cleaned = v.strip()
-        if not cleaned:
-            raise ValueError('Текст жалобы не может состоять только из пробелов')
-        return cleaned
+    model_config = ConfigDict(defer_build=False)
 
 
 class ComplaintResponse(BaseModel):
@@ -44,9 +41,32 @@ class ComplaintResponse(BaseModel):
         examples=["техническая"]
     )
 
+    model_config = ConfigDict(defer_build=False)
+
 
 
-class ComplaintResponseWorkflow(ComplaintResponse):
+class ComplaintResponseWorkflow(BaseModel):
+    """Полная схема жалобы для списков и n8n workflow"""
+    id: int = Field(
+        ...,
+        description="Уникальный идентификатор жалобы",
+        examples=[123]
+    )
+    status: str = Field(
+        ...,
+        description="Статус обработки жалобы",
+        examples=["open"]
+    )
+    sentiment: Optional[str] = Field(
+        None,
+        description="Тональность жалобы (positive/negative/neutral/unknown)",
+        examples=["negative"]
+    )
+    category: Optional[str] = Field(
+        None,
+        description="Категория жалобы (техническая/оплата/другое)",
+        examples=["техническая"]
+    )
     timestamp: datetime = Field(
         ...,
         description="Время создания жалобы",
@@ -68,6 +88,9 @@ class ComplaintResponseWorkflow(ComplaintResponse):
         examples=["Moscow, Russia"]
     )
 
+    model_config = ConfigDict(defer_build=False, extra='ignore')
+
+
 class ComplaintList(BaseModel):
     """Схема для списка жалоб"""
     complaints: List[ComplaintResponseWorkflow] = Field(
@@ -94,16 +117,19 @@ class ComplaintList(BaseModel):
         examples=[20]
     )
 
+    model_config = ConfigDict(defer_build=False)
+
 
 class ComplaintStatusUpdate(BaseModel):
     """Схема для обновления статуса жалобы"""
-    status: str = Field(
+    status: ComplaintStatus = Field(
         ...,
-        pattern="^(open|closed)$",
         description="Новый статус жалобы",
         examples=["closed"]
     )
 
+    model_config = ConfigDict(defer_build=False)
+
 
 class HealthCheck(BaseModel):
     """Схема для проверки здоровья системы"""
@@ -127,6 +153,8 @@ class HealthCheck(BaseModel):
         }]
     )
 
+    model_config = ConfigDict(defer_build=False)
+
 
 class ErrorResponse(BaseModel):
     """Схема для ответов об ошибках"""
@@ -146,12 +174,13 @@ class ErrorResponse(BaseModel):
         examples=["COMPLAINT_NOT_FOUND"]
     )
 
+    model_config = ConfigDict(defer_build=False)
+
 
 class ComplaintFilter(BaseModel):
     """Схема для фильтрации жалоб"""
-    status: Optional[str] = Field(
+    status: Optional[ComplaintStatus] = Field(
         None,
-        pattern="^(open|closed)$",
         description="Фильтр по статусу",
         examples=["open"]
     )
@@ -162,15 +191,13 @@ class ComplaintFilter(BaseModel):
         description="Жалобы за последние N часов",
         examples=[24]
     )
-    category: Optional[str] = Field(
+    category: Optional[ComplaintCategory] = Field(
         None,
-        pattern="^(техническая|оплата|другое)$",
         description="Фильтр по категории",
         examples=["техническая"]
     )
-    sentiment: Optional[str] = Field(
+    sentiment: Optional[ComplaintSentiment] = Field(
         None,
-        pattern="^(positive|negative|neutral|unknown)$",
         description="Фильтр по тональности",
         examples=["negative"]
     )
@@ -186,4 +213,21 @@ class ComplaintFilter(BaseModel):
         ge=0,
         description="Смещение для пагинации",
         examples=[0]
-    )
\ No newline at end of file
+    )
+
+    model_config = ConfigDict(defer_build=False)
+
+
+def warm_up_schemas() -> None:
+    """Сборка валидаторов и сериализаторов DTO заранее, при старте приложения"""
+    for model in (
+            ComplaintCreate,
+            ComplaintResponse,
+            ComplaintResponseWorkflow,
+            ComplaintList,
+            ComplaintStatusUpdate,
+            ComplaintFilter,
+    ):
+        model.model_rebuild()
+        model.__pydantic_validator__
+        model.__pydantic_serializer__
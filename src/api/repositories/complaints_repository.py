@@ -1,80 +1,119 @@
-from datetime import datetime, timedelta
-from typing import List, Optional
+import logging
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple, TypeVar, Union
 
-from sqlalchemy import select, and_
+from sqlalchemy import Row, ScalarResult, select, insert, update, and_, func
 from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi import Depends
 
-from database.session import get_session
+from core.batching import MicroBatcher
+from database.session import async_session_maker, get_session
 from models.complaint_model import Complaint
 
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Параметры пакетной вставки: одновременные создания жалоб пишутся одним executemany
+INSERT_BATCH_MAX = 50
+INSERT_BATCH_WINDOW_MS = 10
+
+
+class ComplaintInsertBatcher(MicroBatcher):
+    """Объединяет одновременные вставки жалоб в один INSERT в отдельной сессии"""
+
+    def __init__(self, max_size: int = INSERT_BATCH_MAX, window_ms: int = INSERT_BATCH_WINDOW_MS):
+        super().__init__(max_size, window_ms)
+
+    async def process(self, rows: List[Dict[str, Any]]) -> List[Union[Row, Exception]]:
+        try:
+            return await self._insert(rows)
+        except Exception:
+            if len(rows) == 1:
+                raise
+            logger.exception("Batch insert of %d complaints failed, retrying row by row", len(rows))
+
+        # Одна плохая строка не должна ронять соседние запросы: ошибку получает только ее вызов
+        results: List[Union[Row, Exception]] = []
+        for row in rows:
+            try:
+                results.extend(await self._insert([row]))
+            except Exception as e:
+                results.append(e)
+        return results
+
+    @staticmethod
+    async def _insert(rows: List[Dict[str, Any]]) -> List[Row]:
+        async with async_session_maker() as session:
+            # sort_by_parameter_order в SQLite выполняет вставки по одной, поэтому порядок
+            # восстанавливается по id: в одной транзакции они выдаются по порядку строк
+            result = await session.execute(insert(Complaint).returning(Complaint.id, Complaint.timestamp), rows)
+            created = sorted(result.all(), key=lambda row: row.id)
+            await session.commit()
+        return created
+
+
+_INSERT_BATCHER: Optional[ComplaintInsertBatcher] = None
+
+
+def get_insert_batcher() -> ComplaintInsertBatcher:
+    global _INSERT_BATCHER
+    if _INSERT_BATCHER is None:
+        _INSERT_BATCHER = ComplaintInsertBatcher()
+    return _INSERT_BATCHER
+
+
+async def close_insert_batcher():
+    global _INSERT_BATCHER
+    if _INSERT_BATCHER is not None:
+        await _INSERT_BATCHER.close()
+        _INSERT_BATCHER = None
+
 
 class ComplaintsRepository:
 
     def __init__(self, session: AsyncSession):
         self.session = session
 
-    async def create_complaint(self, complaint: Complaint) -> Complaint:
-        """Создание новой жалобы"""
-        self.session.add(complaint)
-        await self.session.commit()
-        await self.session.refresh(complaint)
-        return complaint
+    async def create_complaint(self, values: Dict[str, Any]) -> Row:
+        """Создание новой жалобы, возвращает id и timestamp без повторного SELECT.
+
+        Вставка идет через общий пакетный INSERT, а не через сессию запроса.
+        """
+        return await get_insert_batcher().submit(values)
 
     async def get_complaint_by_id(self, complaint_id: int) -> Optional[Complaint]:
         """Получение жалобы по ID"""
-        result = await self.session.execute(
-            select(Complaint).where(Complaint.id == complaint_id)
-        )
-        return result.scalar_one_or_none()
+        return await self.session.get(Complaint, complaint_id)
 
     async def update_complaint_status(self, complaint_id: int, status: str) -> bool:
         """Обновление статуса жалобы"""
         result = await self.session.execute(
-            select(Complaint).where(Complaint.id == complaint_id)
+            update(Complaint).where(Complaint.id == complaint_id).values(status=status)
         )
-        complaint = result.scalar_one_or_none()
-
-        if complaint:
-            complaint.status = status
-            await self.session.commit()
-            return True
-        return False
-
+        await self.session.commit()
+        return result.rowcount > 0
 
     async def update_complaint_spam(self, complaint_id: int, spam: bool) -> bool:
         result = await self.session.execute(
-            select(Complaint).where(Complaint.id == complaint_id)
+            update(Complaint).where(Complaint.id == complaint_id).values(is_spam=spam)
         )
+        await self.session.commit()
+        return result.rowcount > 0
 
-        complaint = result.scalar_one_or_none()
-
-        if complaint:
-            complaint.spam = spam
-            await self.session.commit()
-            return True
-        return False
-
-    async def get_complaints_with_filters(
-            self,
+    @staticmethod
+    def _build_filter_conditions(
             status: Optional[str] = None,
-            since_hours: Optional[int] = None,
+            since_time: Optional[datetime] = None,
             category: Optional[str] = None,
-            sentiment: Optional[str] = None,
-            limit: int = 20,
-            offset: int = 0
-    ) -> List[Complaint]:
-        """Получение жалоб с фильтрацией"""
-        query = select(Complaint)
-
-        # Применяем фильтры
+            sentiment: Optional[str] = None
+    ) -> list:
         conditions = []
 
         if status:
             conditions.append(Complaint.status == status)
 
-        if since_hours:
-            since_time = datetime.utcnow() - timedelta(hours=since_hours)
+        if since_time:
             conditions.append(Complaint.timestamp >= since_time)
 
         if category:
@@ -83,6 +122,27 @@ class ComplaintsRepository:
         if sentiment:
             conditions.append(Complaint.sentiment == sentiment)
 
+        return conditions
+
+    async def get_complaints_with_filters(
+            self,
+            status: Optional[str] = None,
+            since_time: Optional[datetime] = None,
+            category: Optional[str] = None,
+            sentiment: Optional[str] = None,
+            limit: int = 20,
+            offset: int = 0,
+            convert: Optional[Callable[[Complaint], T]] = None
+    ) -> Tuple[List[Union[Complaint, T]], int]:
+        """
+        Получение страницы жалоб с фильтрацией и общим количеством за один запрос.
+        convert применяется к каждой жалобе в том же проходе, где читается total.
+        """
+        conditions = self._build_filter_conditions(status, since_time, category, sentiment)
+
+        # Общее количество считается оконной функцией в том же запросе
+        query = select(Complaint, func.count().over().label("total"))
+
         if conditions:
             query = query.where(and_(*conditions))
 
@@ -91,34 +151,34 @@ class ComplaintsRepository:
         query = query.offset(offset).limit(limit)
 
         result = await self.session.execute(query)
-        return result.scalars().all()
+
+        # Один проход по строкам: собираем (и сразу преобразуем) жалобы и берем total из оконной функции
+        complaints = []
+        total = 0
+        for complaint, total in result:
+            complaints.append(convert(complaint) if convert is not None else complaint)
+
+        if complaints:
+            return complaints, total
+
+        # За пределами последней страницы строк нет, поэтому total берем отдельным запросом
+        if offset:
+            total = await self.count_complaints_with_filters(status, since_time, category, sentiment)
+            return [], total
+
+        return [], 0
 
     async def count_complaints_with_filters(
             self,
             status: Optional[str] = None,
-            since_hours: Optional[int] = None,
+            since_time: Optional[datetime] = None,
             category: Optional[str] = None,
             sentiment: Optional[str] = None
     ) -> int:
         """Подсчет жалоб с фильтрацией"""
-        from sqlalchemy import func
-
         query = select(func.count(Complaint.id))
 
-        conditions = []
-
-        if status:
-            conditions.append(Complaint.status == status)
-
-        if since_hours:
-            since_time = datetime.utcnow() - timedelta(hours=since_hours)
-            conditions.append(Complaint.timestamp >= since_time)
-
-        if category:
-            conditions.append(Complaint.category == category)
-
-        if sentiment:
-            conditions.append(Complaint.sentiment == sentiment)
+        conditions = self._build_filter_conditions(status, since_time, category, sentiment)
 
         if conditions:
             query = query.where(and_(*conditions))
@@ -126,10 +186,8 @@ class ComplaintsRepository:
         result = await self.session.execute(query)
         return result.scalar()
 
-    async def get_recent_complaints_by_category(self, category: str, hours: int = 1) -> List[Complaint]:
+    async def get_recent_complaints_by_category(self, category: str, since_time: datetime) -> ScalarResult[Complaint]:
         """Получение недавних жалоб по категории (для n8n)"""
-        since_time = datetime.utcnow() - timedelta(hours=hours)
-
         query = select(Complaint).where(
             and_(
                 Complaint.category == category,
@@ -139,7 +197,7 @@ class ComplaintsRepository:
         ).order_by(Complaint.timestamp.desc())
 
         result = await self.session.execute(query)
-        return result.scalars().all()
+        return result.scalars()
 
 
 def get_complaints_repository(session: AsyncSession = Depends(get_session)):
@@ -1,12 +1,72 @@
 import asyncio
+import json
 import logging
-from typing import Optional
-from openai import Client
-import aiohttp
+import re
+from collections import Counter
+from typing import List, Optional
+from cachetools import TTLCache
+from openai import AsyncOpenAI, APIStatusError, APITimeoutError
+from core.batching import MicroBatcher
+from core.cache import make_text_cache_key
 from core.config import settings
 
 logger = logging.getLogger(__name__)
 
+# Кэш категорий по хэшу нормализованного текста жалобы
+_CATEGORY_CACHE: TTLCache = TTLCache(maxsize=10_000, ttl=24 * 60 * 60)
+
+# Ключевые слова для определения категории по ответу модели
+_CATEGORY_KEYWORDS = {
+    "техническ": "техническая",
+    "technical": "техническая",
+    "sms": "техническая",
+    "приложени": "техническая",
+    "оплат": "оплата",
+    "payment": "оплата",
+    "billing": "оплата",
+    "тариф": "оплата",
+}
+# Все ключевые слова собраны в одно регулярное выражение, текст сканируется за один проход
+_CATEGORY_KEYWORDS_RE = re.compile("|".join(map(re.escape, _CATEGORY_KEYWORDS)))
+
+# Минимальное число совпадений ключевых слов, при котором OpenAI не вызывается
+KEYWORD_CONFIDENCE_THRESHOLD = 2
+
+# Статичные части промптов собираются один раз при импорте
+_CATEGORIES_PROMPT = """Возможные категории:
+- техническая (проблемы с работой сервиса, техническими функциями, SMS, приложением)
+- оплата (вопросы по биллингу, платежам, тарифам, списаниям)
+- другое (все остальные вопросы)"""
+
+_PROMPT_HEAD = 'Определи категорию жалобы клиента. \n\nТекст жалобы: "'
+_PROMPT_TAIL = '"\n\n' + _CATEGORIES_PROMPT + "\n\nОтветь только одним словом из предложенных вариантов."
+
+_BATCH_PROMPT_HEAD = "Определи категорию каждой жалобы клиента.\n\nЖалобы:\n"
+_BATCH_PROMPT_TAIL = (
+    "\n\n" + _CATEGORIES_PROMPT
+    + "\n\nОтветь только JSON-массивом из {count} строк с категориями в том же порядке, без пояснений."
+)
+
+# Параметры микробатчинга запросов к OpenAI
+BATCH_MAX = 8
+BATCH_WINDOW_MS = 50
+
+
+class CategorizationBatcher(MicroBatcher):
+    """Собирает одновременные запросы на категоризацию в один запрос к OpenAI"""
+
+    def __init__(self, ai_service: "AIService", max_size: int = BATCH_MAX, window_ms: int = BATCH_WINDOW_MS):
+        super().__init__(max_size, window_ms)
+        self.ai_service = ai_service
+
+    async def categorize(self, text: str) -> str:
+        return await self.submit(text)
+
+    async def process(self, texts: List[str]) -> List[str]:
+        if len(texts) == 1:
+            return [await self.ai_service._categorize_single(texts[0])]
+        return await self.ai_service._categorize_batch(texts)
+
 
 class AIService:
     """Сервис для категоризации жалоб через OpenAI GPT"""
@@ -16,28 +76,20 @@ class AIService:
         self.model = settings.openai_settings.model
         self.max_tokens = settings.openai_settings.max_tokens
         self.temperature = settings.openai_settings.temperature
-        self.base_url = "https://api.openai.com/v1/chat/completions"
         self.timeout = 30
-        self._session: Optional[aiohttp.ClientSession] = None
+        self._client = AsyncOpenAI(api_key=self.api_key, timeout=self.timeout)
+        self._batcher = CategorizationBatcher(self)
 
     def _create_categorization_prompt(self, text: str) -> str:
-        prompt = f"""Определи категорию жалобы клиента. 
+        return _PROMPT_HEAD + text + _PROMPT_TAIL
 
-Текст жалобы: "{text}"
-
-Возможные категории:
-- техническая (проблемы с работой сервиса, техническими функциями, SMS, приложением)
-- оплата (вопросы по биллингу, платежам, тарифам, списаниям)
-- другое (все остальные вопросы)
-
-Ответь только одним словом из предложенных вариантов."""
-        return prompt
+    def _create_batch_categorization_prompt(self, texts: List[str]) -> str:
+        complaints = "\n".join(f"{i}. {json.dumps(text, ensure_ascii=False)}" for i, text in enumerate(texts, 1))
+        return _BATCH_PROMPT_HEAD + complaints + _BATCH_PROMPT_TAIL.format(count=len(texts))
 
     async def send_openai_request(self, text: str):
         """Отправка запроса к OpenAI API"""
-        client = Client(api_key=self.api_key)
-
-        completion = client.chat.completions.create(
+        completion = await self._client.chat.completions.create(
             model=self.model,
             store=True,
             messages=[
@@ -47,44 +99,108 @@ class AIService:
 
         return completion.choices[0].message
 
+    async def send_openai_batch_request(self, texts: List[str]):
+        """Отправка одного запроса к OpenAI API для пачки жалоб"""
+        completion = await self._client.chat.completions.create(
+            model=self.model,
+            store=True,
+            messages=[
+                {"role": "user", "content": self._create_batch_categorization_prompt(texts)},
+            ]
+        )
+
+        return completion.choices[0].message
+
+    def _parse_category(self, content: str) -> str:
+        # Валидация категории
+        valid_categories = ["техническая", "оплата", "другое"]
+
+        for category in valid_categories:
+            if category in content:
+                logger.info(f"AI categorized complaint as: {category}")
+                return category
+
+        match = _CATEGORY_KEYWORDS_RE.search(content)
+        if match:
+            return _CATEGORY_KEYWORDS[match.group(0)]
+
+        logger.warning(f"Could not determine category from AI response: {content}")
+        return "другое"
+
+    def _classify_by_keywords(self, text: str) -> Optional[str]:
+        """Категория по ключевым словам, если совпадения однозначно указывают на одну категорию"""
+        hits = Counter(_CATEGORY_KEYWORDS[match.group(0)] for match in _CATEGORY_KEYWORDS_RE.finditer(text.lower()))
+
+        if len(hits) == 1:
+            category, count = hits.most_common(1)[0]
+            if count >= KEYWORD_CONFIDENCE_THRESHOLD:
+                return category
+        return None
+
     async def categorize_complaint(self, text: str) -> str:
         if not text or not text.strip():
             return "другое"
 
-        try:
-            response_data = await self.send_openai_request(text)
-
+        # Порядок: кэш -> ключевые слова -> OpenAI
+        cached_category = _CATEGORY_CACHE.get(make_text_cache_key(text))
+        if cached_category is not None:
+            return cached_category
 
-            content = response_data.content.lower()
+        keyword_category = self._classify_by_keywords(text)
+        if keyword_category is not None:
+            logger.info(f"Complaint categorized by keywords as: {keyword_category}")
+            return keyword_category
 
-            # Валидация категории
-            valid_categories = ["техническая", "оплата", "другое"]
+        return await self._batcher.categorize(text)
 
-            for category in valid_categories:
-                if category in content:
-                    logger.info(f"AI categorized complaint as: {category}")
-                    return category
+    async def _categorize_batch(self, texts: List[str]) -> List[str]:
+        try:
+            response_data = await self.send_openai_batch_request(texts)
+        except APIStatusError as e:
+            # Повтор по одной жалобе только умножит запросы в тот же лимит или ту же ошибку
+            logger.error(f"OpenAI API error in batch categorization: {e}")
+            return ["другое"] * len(texts)
+        except APITimeoutError:
+            logger.error("OpenAI API timeout in batch categorization")
+            return ["другое"] * len(texts)
+        except Exception as e:
+            logger.error(f"Unexpected error in batch categorization: {e}")
+            return ["другое"] * len(texts)
 
-            if any(word in content for word in ["техническ", "technical", "sms", "приложени"]):
-                return "техническая"
-            elif any(word in content for word in ["оплат", "payment", "billing", "тариф"]):
-                return "оплата"
+        try:
+            contents = json.loads(response_data.content)
+            if not isinstance(contents, list) or len(contents) != len(texts):
+                raise ValueError(f"Unexpected batch response: {response_data.content}")
+        except (TypeError, ValueError) as e:
+            # Модель ответила не в том формате: категоризируем жалобы по одной
+            logger.warning(f"Batch categorization failed, falling back to single requests: {e}")
+            return list(await asyncio.gather(*(self._categorize_single(text) for text in texts)))
+
+        categories = [self._parse_category(str(content).lower()) for content in contents]
+        for text, category in zip(texts, categories):
+            _CATEGORY_CACHE[make_text_cache_key(text)] = category
+        return categories
+
+    async def _categorize_single(self, text: str) -> str:
+        try:
+            response_data = await self.send_openai_request(text)
 
-            logger.warning(f"Could not determine category from AI response: {content}")
-            return "другое"
+            category = self._parse_category(response_data.content.lower())
+            _CATEGORY_CACHE[make_text_cache_key(text)] = category
+            return category
 
-        except aiohttp.ClientResponseError as e:
-            if e.status == 401:
+        except APIStatusError as e:
+            if e.status_code == 401:
                 logger.error("OpenAI API authentication failed - check API key")
-            elif e.status == 429:
+            elif e.status_code == 429:
                 logger.error("OpenAI API rate limit exceeded - try again later")
-            elif e.status == 400:
+            elif e.status_code == 400:
                 logger.error("OpenAI API bad request - check prompt format")
             else:
                 logger.error(f"OpenAI API error: {e}")
             return "другое"
 
-        except asyncio.TimeoutError:
+        except APITimeoutError:
             logger.error("OpenAI API timeout")
             return "другое"
 
@@ -100,9 +216,9 @@ class AIService:
             return False
 
     async def close(self):
-        """Закрытие HTTP сессии"""
-        if self._session and not self._session.closed:
-            await self._session.close()
+        """Закрытие HTTP клиента OpenAI"""
+        await self._batcher.close()
+        await self._client.close()
 
     async def __aenter__(self):
         return self
@@ -111,6 +227,19 @@ class AIService:
         await self.close()
 
 
+_AI_SERVICE: Optional[AIService] = None
+
+
 def get_ai_service() -> AIService:
     """Dependency для получения AI сервиса"""
-    return AIService()
\ No newline at end of file
+    global _AI_SERVICE
+    if _AI_SERVICE is None:
+        _AI_SERVICE = AIService()
+    return _AI_SERVICE
+
+
+async def close_ai_service():
+    global _AI_SERVICE
+    if _AI_SERVICE is not None:
+        await _AI_SERVICE.close()
+        _AI_SERVICE = None
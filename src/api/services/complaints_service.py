@@ -1,9 +1,9 @@
 import asyncio
 import logging
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
 from typing import List, Optional
 from starlette import status as starlette_status
-from fastapi import Depends, Request, HTTPException, status
+from fastapi import Depends, HTTPException, status
 
 from api.repositories.complaints_repository import ComplaintsRepository, get_complaints_repository
 from api.dto.complaints_dto import ComplaintCreate, ComplaintResponse, ComplaintList, ComplaintResponseWorkflow
@@ -30,59 +30,64 @@ class ComplaintsService:
         self.spam_service = spam_service
         self.ai_service = ai_service
 
+    @staticmethod
+    def _to_workflow_response(complaint: Complaint) -> ComplaintResponseWorkflow:
+        # Данные приходят из БД, поэтому валидация pydantic не нужна
+        return ComplaintResponseWorkflow.model_construct(
+            id=complaint.id,
+            status=complaint.status,
+            sentiment=complaint.sentiment,
+            category=complaint.category,
+            timestamp=complaint.timestamp,
+            text=complaint.text,
+            is_spam=complaint.is_spam,
+            ip_location=complaint.ip_location
+        )
+
     async def create_complaint_service(
             self,
             complaint_data: ComplaintCreate,
-            request: Request
+            client_location: Optional[str]
     ) -> ComplaintResponse:
         """Создание новой жалобы с полной обработкой"""
         try:
-            # Получаем данные из middleware
-            client_location = getattr(request.state, 'client_location', None)
-
-            # Создаем объект жалобы
-            complaint = Complaint(
-                text=complaint_data.text,
-                status="open",
-                timestamp=datetime.utcnow(),
-                ip_location=client_location
+            # Анализ тональности, категоризация и проверка на спам выполняются параллельно
+            sentiment, category, is_spam = await asyncio.gather(
+                self.sentiment_service.analyze_sentiment(complaint_data.text),
+                self.ai_service.categorize_complaint(complaint_data.text),
+                self.spam_service.check_spam(complaint_data.text),
+                return_exceptions=True
             )
 
-            # Анализ тональности
-            try:
-                sentiment = await self.sentiment_service.analyze_sentiment(complaint_data.text)
-                complaint.sentiment = sentiment
-            except Exception as e:
-                logger.error(f"Sentiment analysis failed: {e}")
-                complaint.sentiment = "unknown"
-
-            # Определение категории
-            try:
-                category = await self.ai_service.categorize_complaint(complaint_data.text)
-                complaint.category = category
-            except Exception as e:
-                logger.error(f"Ошибка при определении категории: {e}")
-                complaint.category = "другое"
-
-            try:
-                is_spam = await self.spam_service.check_spam(complaint_data.text)
-                complaint.is_spam = is_spam
-            except Exception as e:
-                logger.error(f"Spam check failed: {e}")
-                complaint.is_spam = False
-
-            saved_complaint = await self.complaints_repository.create_complaint(complaint)
-
-            # Запускаем категоризацию асинхронно
-            asyncio.create_task(
-                self._classification_spam(saved_complaint.id, complaint_data.text)
-            )
+            if isinstance(sentiment, Exception):
+                logger.error(f"Sentiment analysis failed: {sentiment}")
+                sentiment = "unknown"
+
+            if isinstance(category, Exception):
+                logger.error(f"Ошибка при определении категории: {category}")
+                category = "другое"
+
+            if isinstance(is_spam, Exception):
+                logger.error(f"Spam check failed: {is_spam}")
+                is_spam = False
 
-            return ComplaintResponse(
+            complaint_values = {
+                "text": complaint_data.text,
+                "status": "open",
+                "timestamp": datetime.now(timezone.utc),
+                "sentiment": sentiment,
+                "category": category,
+                "is_spam": is_spam,
+                "ip_location": client_location
+            }
+
+            saved_complaint = await self.complaints_repository.create_complaint(complaint_values)
+
+            return ComplaintResponse.model_construct(
                 id=saved_complaint.id,
-                status=saved_complaint.status,
-                sentiment=saved_complaint.sentiment,
-                category=saved_complaint.category,
+                status=complaint_values["status"],
+                sentiment=sentiment,
+                category=category,
             )
 
         except Exception as e:
@@ -92,18 +97,6 @@ class ComplaintsService:
                 detail="Internal server error while processing complaint"
             )
 
-    async def _classification_spam(self, complaint_id: int, complaint_text: str):
-        try:
-            is_spam = await self.spam_service.check_spam(complaint_text)
-            success = await self.complaints_repository.update_complaint_spam(complaint_id, is_spam)
-
-            if success:
-                logger.info(f"Complaint {complaint_id} spam as: {is_spam}")
-            else:
-                logger.error(f"Failed to update spam for complaint {complaint_id}")
-        except Exception as e:
-            logger.error(f"{complaint_id}: {e}")
-
     async def get_complaints_list(
             self,
             status: Optional[str] = None,
@@ -114,40 +107,23 @@ class ComplaintsService:
             offset: int = 0
     ) -> ComplaintList:
         try:
-            complaints = await self.complaints_repository.get_complaints_with_filters(
+            # Одна точка отсчета времени на весь запрос
+            since_time = datetime.now(timezone.utc) - timedelta(hours=since_hours) if since_hours else None
+
+            complaints, total = await self.complaints_repository.get_complaints_with_filters(
                 status=status,
-                since_hours=since_hours,
+                since_time=since_time,
                 category=category,
                 sentiment=sentiment,
                 limit=limit,
-                offset=offset
+                offset=offset,
+                convert=self._to_workflow_response
             )
 
-            total = await self.complaints_repository.count_complaints_with_filters(
-                status=status,
-                since_hours=since_hours,
-                category=category,
-                sentiment=sentiment
-            )
-
-            complaint_responses = [
-                ComplaintResponseWorkflow(
-                    id=complaint.id,
-                    status=complaint.status,
-                    sentiment=complaint.sentiment,
-                    category=complaint.category,
-                    timestamp=complaint.timestamp,
-                    text=complaint.text,
-                    is_spam=complaint.is_spam,
-                    ip_location=complaint.ip_location
-                )
-                for complaint in complaints
-            ]
-
             page = (offset // limit) + 1
 
-            return ComplaintList(
-                complaints=complaint_responses,
+            return ComplaintList.model_construct(
+                complaints=complaints,
                 total=total,
                 page=page,
                 per_page=limit
@@ -170,16 +146,7 @@ class ComplaintsService:
                     detail="Complaint not found"
                 )
 
-            return ComplaintResponseWorkflow(
-                id=complaint.id,
-                status=complaint.status,
-                sentiment=complaint.sentiment,
-                category=complaint.category,
-                timestamp=complaint.timestamp,
-                text=complaint.text,
-                is_spam=complaint.is_spam,
-                ip_location=complaint.ip_location
-            )
+            return self._to_workflow_response(complaint)
 
         except HTTPException:
             raise
@@ -192,12 +159,6 @@ class ComplaintsService:
 
     async def update_complaint_status(self, complaint_id: int, new_status: str) -> dict:
         try:
-            if new_status not in ["open", "closed"]:
-                raise HTTPException(
-                    status_code=status.HTTP_400_BAD_REQUEST,
-                    detail="Status must be 'open' or 'closed'"
-                )
-
             success = await self.complaints_repository.update_complaint_status(
                 complaint_id, new_status
             )
@@ -226,21 +187,14 @@ class ComplaintsService:
     ) -> List[ComplaintResponse]:
         """Получение недавних жалоб для автоматизации n8n"""
         try:
+            since_time = datetime.now(timezone.utc) - timedelta(hours=hours)
+
             complaints = await self.complaints_repository.get_recent_complaints_by_category(
-                category, hours
+                category, since_time
             )
 
             return [
-                ComplaintResponseWorkflow(
-                    id=complaint.id,
-                    status=complaint.status,
-                    sentiment=complaint.sentiment,
-                    category=complaint.category,
-                    timestamp=complaint.timestamp,
-                    text=complaint.text,
-                    is_spam=complaint.is_spam,
-                    ip_location=complaint.ip_location
-                )
+                self._to_workflow_response(complaint)
                 for complaint in complaints
             ]
 
@@ -1,58 +1,169 @@
 import asyncio
+import ipaddress
 import logging
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List, Tuple
+from cachetools import TTLCache
+from core.batching import MicroBatcher
+from core.cache import single_flight
 from core.config import settings
+from core.http import get_http_session
+from core.resilience import CircuitBreaker, with_retry
 import aiohttp
+import orjson
 
 logger = logging.getLogger(__name__)
 
+# Кэш геолокации по IP: ответы ip-api.com стабильны часами
+_LOCATION_CACHE: TTLCache = TTLCache(maxsize=10_000, ttl=60 * 60)
+_DETAILED_LOCATION_CACHE: TTLCache = TTLCache(maxsize=10_000, ttl=60 * 60)
+# IP, для которых ip-api.com ответил "fail", кэшируются ненадолго
+_NEGATIVE_LOCATION_CACHE: TTLCache = TTLCache(maxsize=10_000, ttl=60)
+# Определяемые прямо сейчас IP: повторные запросы ждут уже идущий вызов
+_INFLIGHT_LOCATIONS: Dict[str, asyncio.Task] = {}
+
+# Параметры объединения запросов в /batch (ip-api.com принимает до 100 IP за раз)
+BATCH_MAX = 100
+BATCH_WINDOW_MS = 20
+
+# Не больше стольких одновременных запросов к ip-api.com
+IP_API_SEM = asyncio.Semaphore(10)
+
+# Размыкается после серии сбоев ip-api.com, чтобы не ждать тайм-аутов на каждом запросе
+_LOCATION_BREAKER = CircuitBreaker("ip-api")
+
+
+def is_routable_ip(ip: Optional[str]) -> bool:
+    """Проверка, имеет ли смысл спрашивать ip-api.com про адрес"""
+    if not ip:
+        return False
+    try:
+        addr = ipaddress.ip_address(ip)
+    except ValueError:
+        return False
+    # Для частных, локальных и зарезервированных адресов ip-api.com вернет "fail"
+    return not (addr.is_private or addr.is_loopback or addr.is_link_local or addr.is_reserved)
+
+
+class _BatchQueue(MicroBatcher):
+    """Объединяет одновременные запросы геолокации в один запрос к /batch"""
+
+    def __init__(self, location_service: "LocationService", max_size: int = BATCH_MAX, window_ms: int = BATCH_WINDOW_MS):
+        super().__init__(max_size, window_ms)
+        self.location_service = location_service
+
+    async def process(self, ips: List[str]) -> List[Dict[str, Any]]:
+        if len(ips) == 1:
+            return [await self.location_service.send_request(ips[0])]
+        return await self.location_service.get_locations_batch(ips)
+
 
 class LocationService:
     def __init__(self):
         self.url = settings.optional_api_settings.ip_api_url
-        self.timeout = 10
-        self._session: Optional[aiohttp.ClientSession] = None
+        self.batch_url = settings.optional_api_settings.ip_api_batch_url
+        self.timeout = aiohttp.ClientTimeout(total=10)
+        self._batch_queue = _BatchQueue(self)
 
     async def get_session(self) -> aiohttp.ClientSession:
-        if self._session is None or self._session.closed:
-            timeout = aiohttp.ClientTimeout(total=self.timeout)
-            self._session = aiohttp.ClientSession(timeout=timeout)
-        return self._session
+        return get_http_session()
 
+    @with_retry()
     async def send_request(self, ip: str) -> Dict[str, Any]:
-        if not ip or not ip.strip():
+        ip = ip.strip() if ip else ""
+        if not ip:
             raise ValueError("IP address cannot be empty")
 
         session = await self.get_session()
 
-        url = f"{self.url}/{ip.strip()}"
+        url = f"{self.url}/{ip}"
 
-        logger.debug(f"Requesting geolocation for IP: {ip}")
+        logger.debug("Requesting geolocation for IP: %s", ip)
 
-        async with session.get(url) as response:
-            if response.status == 200:
-                data = await response.json()
-                logger.debug(f"Geolocation API response: {data}")
-                return data
-            else:
-                error_text = await response.text()
-                logger.error(f"Geolocation API error {response.status}: {error_text}")
-                raise aiohttp.ClientResponseError(
-                    request_info=response.request_info,
-                    history=response.history,
-                    status=response.status,
-                    message=error_text
-                )
+        # Ограничение одновременных запросов к ip-api.com (бесплатный тариф режет всплески)
+        async with IP_API_SEM:
+            async with session.get(url, timeout=self.timeout) as response:
+                if response.status == 200:
+                    data = orjson.loads(await response.read())
+                    logger.debug("Geolocation API response: %s", data)
+                    return data
+                else:
+                    error_text = await response.text()
+                    logger.error(f"Geolocation API error {response.status}: {error_text}")
+                    raise aiohttp.ClientResponseError(
+                        request_info=response.request_info,
+                        history=response.history,
+                        status=response.status,
+                        message=error_text
+                    )
+
+    @with_retry()
+    async def get_locations_batch(self, ips: List[str]) -> List[Dict[str, Any]]:
+        """Геолокация нескольких IP одним запросом, ответы возвращаются в порядке ips"""
+        unique_ips = list(dict.fromkeys(ips))
+
+        session = await self.get_session()
+
+        logger.debug("Requesting batch geolocation for %d IPs", len(unique_ips))
+
+        async with IP_API_SEM:
+            async with session.post(
+                    self.batch_url, json=[{"query": ip} for ip in unique_ips], timeout=self.timeout
+            ) as response:
+                if response.status != 200:
+                    error_text = await response.text()
+                    logger.error(f"Geolocation batch API error {response.status}: {error_text}")
+                    raise aiohttp.ClientResponseError(
+                        request_info=response.request_info,
+                        history=response.history,
+                        status=response.status,
+                        message=error_text
+                    )
+                data = orjson.loads(await response.read())
+
+        # ip-api.com возвращает результаты в том же порядке, что и запросы
+        results = dict(zip(unique_ips, data))
+        return [results[ip] for ip in ips]
 
     async def get_location(self, ip: str) -> Optional[str]:
+        ip = ip.strip() if ip else ip
+        if not is_routable_ip(ip):
+            return None
+
+        cached_location = _LOCATION_CACHE.get(ip)
+        if cached_location is not None:
+            return cached_location
+        if ip in _NEGATIVE_LOCATION_CACHE:
+            return None
+        if not _LOCATION_BREAKER.allow():
+            return None
+
+        return await single_flight(_INFLIGHT_LOCATIONS, ip, lambda: self._resolve_location(ip))
+
+    async def _resolve_location(self, ip: str) -> Optional[str]:
+        location, rejected = await self._fetch_location(ip)
+
+        if location is not None:
+            _LOCATION_CACHE[ip] = location
+        # Сетевые сбои и 5xx не кэшируются: с ними разбирается circuit breaker
+        elif rejected:
+            _NEGATIVE_LOCATION_CACHE[ip] = True
+        return location
+
+    async def _fetch_location(self, ip: str) -> Tuple[Optional[str], bool]:
+        """Локация для IP и признак того, что ip-api.com явно отказал ("fail")"""
         try:
-            response_data = await self.send_request(ip)
+            if not ip:
+                raise ValueError("IP address cannot be empty")
+
+            # Одновременные запросы объединяются в один вызов /batch
+            response_data = await self._batch_queue.submit(ip)
+            _LOCATION_BREAKER.record_success()
 
             # Проверяем успешность запроса
             status = response_data.get("status")
             if status != "success":
                 logger.warning(f"Geolocation failed for {ip}: {response_data.get('message', 'Unknown error')}")
-                return None
+                return None, True
 
             # Формируем строку с локацией
             city = response_data.get("city", "")
@@ -70,34 +181,45 @@ class LocationService:
 
             if location_parts:
                 location = ", ".join(location_parts)
-                logger.info(f"Location for {ip}: {location}")
-                return location
+                logger.info("Location for %s: %s", ip, location)
+                return location, False
             else:
                 logger.warning(f"Нет данных о местоположении для {ip}")
-                return None
+                return None, False
 
         except ValueError as e:
             logger.error(f"Ошибка валидации: {e}")
-            return None
+            return None, False
 
         except asyncio.TimeoutError:
             logger.error(f"Тайм-аут геолокации для {ip}")
-            return None
+            _LOCATION_BREAKER.record_failure()
+            return None, False
 
         except aiohttp.ClientError as e:
             logger.error(f"Ошибка HTTP в геолокации: {e}")
-            return None
+            _LOCATION_BREAKER.record_failure()
+            return None, False
 
         except Exception as e:
             logger.error(f"Неожиданная ошибка геолокации: {e}")
-            return None
+            _LOCATION_BREAKER.record_failure()
+            return None, False
 
     async def get_detailed_location(self, ip: str) -> Optional[Dict[str, Any]]:
+        ip = ip.strip() if ip else ip
+        if not is_routable_ip(ip):
+            return None
+
+        cached_location = _DETAILED_LOCATION_CACHE.get(ip)
+        if cached_location is not None:
+            return cached_location
+
         try:
             response_data = await self.send_request(ip)
 
             if response_data.get("status") == "success":
-                return {
+                location = {
                     "ip": response_data.get("query"),
                     "country": response_data.get("country"),
                     "country_code": response_data.get("countryCode"),
@@ -111,16 +233,28 @@ class LocationService:
                     "isp": response_data.get("isp"),
                     "organization": response_data.get("org")
                 }
+                _DETAILED_LOCATION_CACHE[ip] = location
+                return location
             return None
 
         except Exception as e:
             logger.error(f"Error getting detailed location: {e}")
             return None
 
+    async def health_check(self) -> bool:
+        """Проверка работоспособности сервиса"""
+        # Проба идет мимо кэша геолокации, иначе сбой ip-api.com не будет заметен
+        if _LOCATION_BREAKER.is_open:
+            return False
+        try:
+            response_data = await self.send_request("8.8.8.8")  # Google DNS
+            return response_data.get("status") == "success"
+        except Exception:
+            return False
+
     async def close(self):
-        """Закрытие HTTP сессии"""
-        if self._session and not self._session.closed:
-            await self._session.close()
+        """Остановка очереди batch-запросов"""
+        await self._batch_queue.close()
 
     async def __aenter__(self):
         return self
@@ -129,5 +263,18 @@ class LocationService:
         await self.close()
 
 
+_LOCATION_SERVICE: Optional[LocationService] = None
+
+
 def get_location_service() -> LocationService:
-    return LocationService()
+    global _LOCATION_SERVICE
+    if _LOCATION_SERVICE is None:
+        _LOCATION_SERVICE = LocationService()
+    return _LOCATION_SERVICE
+
+
+async def close_location_service():
+    global _LOCATION_SERVICE
+    if _LOCATION_SERVICE is not None:
+        await _LOCATION_SERVICE.close()
+        _LOCATION_SERVICE = None
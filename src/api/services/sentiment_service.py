@@ -1,129 +1,147 @@
 import asyncio
 import logging
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Tuple
 
 import aiohttp
+import orjson
+from cachetools import TTLCache
+from core.cache import make_text_cache_key, single_flight
 from core.config import settings
+from core.http import get_http_session
+from core.resilience import CircuitBreaker, with_retry
 
 logger = logging.getLogger(__name__)
 
+# Кэш тональности по хэшу нормализованного текста
+_SENTIMENT_CACHE: TTLCache = TTLCache(maxsize=10_000, ttl=24 * 60 * 60)
+# Тексты, которые API отверг или для которых вернул невалидную тональность, ненадолго запоминаются
+_NEGATIVE_SENTIMENT_CACHE: TTLCache = TTLCache(maxsize=10_000, ttl=60)
+# Анализируемые прямо сейчас тексты (по ключу кэша): дубли ждут уже идущий запрос
+_INFLIGHT_SENTIMENTS: Dict[bytes, asyncio.Task] = {}
+
+# Не больше стольких одновременных запросов к Sentiment API
+SENTIMENT_SEM = asyncio.Semaphore(5)
+
+# Размыкается после серии сбоев Sentiment API: жалобы сохраняются с "unknown" без ожидания
+_SENTIMENT_BREAKER = CircuitBreaker("sentiment-api")
+
+# Коды ошибок APILayer: (название для лога, подсказка, шаблон сообщения исключения)
+_ERROR_DETAILS: Dict[int, Tuple[str, Optional[str], str]] = {
+    400: (
+        "Bad Request",
+        "Возможные причины: отсутствует обязательный параметр, неверный формат текста.",
+        "Bad Request: {message}"
+    ),
+    401: (
+        "Unauthorized",
+        "Ключ API недействителен или отсутствует",
+        "Unauthorized: действительный ключ API не предоставлен. {message}"
+    ),
+    404: (
+        "Not Found",
+        "Запрошенный ресурс не существует — проверьте конечную точку API",
+        "Resource not found: {message}"
+    ),
+    429: (
+        "Rate Limit",
+        "Превышен лимит запросов API",
+        "Rate limit exceeded: {message}"
+    ),
+}
+_SERVER_ERROR_DETAILS = ("Server Error", "Сервер APILayer не смог обработать запрос", "Server error: {message}")
+_UNEXPECTED_ERROR_DETAILS = ("Unexpected error", None, "Unexpected error: {message}")
+
+# Подсказки в лог при ошибке ответа Sentiment API
+_RESPONSE_ERROR_HINTS: Dict[int, str] = {
+    400: "Неправильный запрос к Sentiment API — проверьте формат текста",
+    401: "Ошибка аутентификации Sentiment API — проверьте ключ API в настройках",
+    404: "Конечная точка Sentiment API не найдена — проверьте конфигурацию URL",
+    429: "Превышен лимит Sentiment API — повторите попытку позже",
+}
+
 
 class SentimentService:
     def __init__(self):
         self.url = settings.sentiment_api_settings.base_url
         self.api_key = settings.sentiment_api_settings.api_key
-        self.timeout = settings.sentiment_api_settings.timeout
-        self._session: Optional[aiohttp.ClientSession] = None
+        self.timeout = aiohttp.ClientTimeout(total=settings.sentiment_api_settings.timeout)
+        self._headers = {
+            "apikey": self.api_key,
+        }
 
     async def get_session(self) -> aiohttp.ClientSession:
-        if self._session is None or self._session.closed:
-            timeout = aiohttp.ClientTimeout(total=self.timeout)
-            self._session = aiohttp.ClientSession(timeout=timeout)
-        return self._session
+        return get_http_session()
 
+    @with_retry()
     async def send_request(self, text: str) -> Dict[str, Any]:
-        if not text or not text.strip():
+        text = text.strip() if text else ""
+        if not text:
             raise ValueError("Текст не может быть пустым")
 
         session = await self.get_session()
 
-        headers = {
-            "apikey": self.api_key,
-        }
-
         payload = {
-            "text": text.strip()
+            "text": text
         }
 
-        logger.debug(f"Отправка запроса на анализ настроений по длине текста: {len(text)}")
-
-        async with session.post(self.url, headers=headers, json=payload, ssl=False) as response:
-            response_text = await response.text()
-
-            if response.status == 200:
+        logger.debug("Отправка запроса на анализ настроений по длине текста: %d", len(text))
+
+        async with SENTIMENT_SEM:
+            async with session.post(self.url, headers=self._headers, json=payload, ssl=False, timeout=self.timeout) as response:
+                body = await response.read()
+
+                if response.status == 200:
+                    try:
+                        data = orjson.loads(body) if body else {}
+                        logger.info("Успех Sentiment API: %s", data)
+                        return data
+                    except Exception as e:
+                        logger.error(f"Не удалось проанализировать ответ JSON: {e}")
+                        raise aiohttp.ClientResponseError(
+                            request_info=response.request_info,
+                            history=response.history,
+                            status=response.status,
+                            message="Неверный ответ JSON"
+                        )
+
+                response_text = body.decode(errors="replace")
+                error_message = response_text
                 try:
-                    data = await response.json() if response_text else {}
-                    logger.info(f"Успех Sentiment API: {data}")
-                    return data
-                except Exception as e:
-                    logger.error(f"Не удалось проанализировать ответ JSON: {e}")
-                    raise aiohttp.ClientResponseError(
-                        request_info=response.request_info,
-                        history=response.history,
-                        status=response.status,
-                        message="Неверный ответ JSON"
-                    )
-
-            error_message = response_text
-            try:
-                error_data = await response.json() if response_text else {}
-                error_message = error_data.get('message', response_text)
-            except:
-                pass
-
-            # Обработка конкретных кодов ошибок APILayer
-            if response.status == 400:
-                logger.error(f"Sentiment API - Bad Request (400): {error_message}")
-                logger.error("Возможные причины: отсутствует обязательный параметр, неверный формат текста.")
-                raise aiohttp.ClientResponseError(
-                    request_info=response.request_info,
-                    history=response.history,
-                    status=response.status,
-                    message=f"Bad Request: {error_message}"
+                    error_data = orjson.loads(body) if body else {}
+                    error_message = error_data.get('message', response_text)
+                except Exception:
+                    pass
+
+                # Обработка конкретных кодов ошибок APILayer
+                label, hint, template = _ERROR_DETAILS.get(response.status) or (
+                    _SERVER_ERROR_DETAILS if 500 <= response.status < 600 else _UNEXPECTED_ERROR_DETAILS
                 )
-
-            elif response.status == 401:
-                logger.error(f"Sentiment API - Unauthorized (401): {error_message}")
-                logger.error("Ключ API недействителен или отсутствует")
-                raise aiohttp.ClientResponseError(
-                    request_info=response.request_info,
-                    history=response.history,
-                    status=response.status,
-                    message=f"Unauthorized: действительный ключ API не предоставлен. {error_message}"
-                )
-
-            elif response.status == 404:
-                logger.error(f"Sentiment API - Not Found (404): {error_message}")
-                logger.error("Запрошенный ресурс не существует — проверьте конечную точку API")
+                logger.error("Sentiment API - %s (%d): %s", label, response.status, error_message)
+                if hint:
+                    logger.error(hint)
                 raise aiohttp.ClientResponseError(
                     request_info=response.request_info,
                     history=response.history,
                     status=response.status,
-                    message=f"Resource not found: {error_message}"
+                    message=template.format(message=error_message)
                 )
 
-            elif response.status == 429:
-                logger.error(f"Sentiment API - Rate Limit (429): {error_message}")
-                logger.error("Превышен лимит запросов API")
-                raise aiohttp.ClientResponseError(
-                    request_info=response.request_info,
-                    history=response.history,
-                    status=response.status,
-                    message=f"Rate limit exceeded: {error_message}"
-                )
+    async def analyze_sentiment(self, text: str) -> str:
+        cache_key = make_text_cache_key(text or "", lowercase=False)
+        cached_sentiment = _SENTIMENT_CACHE.get(cache_key)
+        if cached_sentiment is not None:
+            return cached_sentiment
+        if cache_key in _NEGATIVE_SENTIMENT_CACHE:
+            return "unknown"
+        if not _SENTIMENT_BREAKER.allow():
+            return "unknown"
 
-            elif 500 <= response.status < 600:
-                logger.error(f"Sentiment API - Server Error ({response.status}): {error_message}")
-                logger.error("Сервер APILayer не смог обработать запрос")
-                raise aiohttp.ClientResponseError(
-                    request_info=response.request_info,
-                    history=response.history,
-                    status=response.status,
-                    message=f"Server error: {error_message}"
-                )
+        return await single_flight(_INFLIGHT_SENTIMENTS, cache_key, lambda: self._analyze_uncached(text, cache_key))
 
-            else:
-                logger.error(f"Sentiment API - Unexpected error ({response.status}): {error_message}")
-                raise aiohttp.ClientResponseError(
-                    request_info=response.request_info,
-                    history=response.history,
-                    status=response.status,
-                    message=f"Unexpected error: {error_message}"
-                )
-
-    async def analyze_sentiment(self, text: str) -> str:
+    async def _analyze_uncached(self, text: str, cache_key: bytes) -> str:
         try:
             response_data = await self.send_request(text)
+            _SENTIMENT_BREAKER.record_success()
 
             # Парсинг ответа APILayer
             sentiment = response_data.get("sentiment", "unknown").lower()
@@ -133,9 +151,11 @@ class SentimentService:
             valid_sentiments = ["positive", "negative", "neutral"]
             if sentiment in valid_sentiments:
                 logger.info(f"Sentiment detected: {sentiment} (confidence: {confidence})")
+                _SENTIMENT_CACHE[cache_key] = sentiment
                 return sentiment
             else:
                 logger.warning(f"Invalid sentiment value: {sentiment}")
+                _NEGATIVE_SENTIMENT_CACHE[cache_key] = True
                 return "unknown"
 
         except ValueError as e:
@@ -144,48 +164,50 @@ class SentimentService:
 
         except asyncio.TimeoutError:
             logger.error("Sentiment analysis timeout")
+            _SENTIMENT_BREAKER.record_failure()
             return "unknown"
 
         except aiohttp.ClientResponseError as e:
-            if e.status == 400:
-                logger.error("Неправильный запрос к Sentiment API — проверьте формат текста")
-            elif e.status == 401:
-                logger.error("Ошибка аутентификации Sentiment API — проверьте ключ API в настройках")
-            elif e.status == 404:
-                logger.error("Конечная точка Sentiment API не найдена — проверьте конфигурацию URL")
-            elif e.status == 429:
-                logger.error("Превышен лимит Sentiment API — повторите попытку позже")
-            elif 500 <= e.status < 600:
-                logger.error("Ошибка сервера Sentiment API — сервис временно недоступен")
-
+            hint = _RESPONSE_ERROR_HINTS.get(e.status)
+            if hint is None and 500 <= e.status < 600:
+                hint = "Ошибка сервера Sentiment API — сервис временно недоступен"
+            if hint:
+                logger.error(hint)
+
+            # Ошибки запроса (400/401/404) не говорят о недоступности сервиса
+            if e.status == 429 or 500 <= e.status < 600:
+                _SENTIMENT_BREAKER.record_failure()
+            # Повтор того же текста получит тот же отказ
+            elif e.status == 400:
+                _NEGATIVE_SENTIMENT_CACHE[cache_key] = True
             return "unknown"
 
         except aiohttp.ClientError as e:
             logger.error(f"HTTP error in sentiment analysis: {e}")
+            _SENTIMENT_BREAKER.record_failure()
             return "unknown"
 
         except Exception as e:
             logger.error(f"Unexpected error in sentiment analysis: {e}")
             return "unknown"
 
-    async def close(self):
-        if self._session and not self._session.closed:
-            await self._session.close()
-
-    async def __aenter__(self):
-        return self
-
-    async def __aexit__(self, exc_type, exc_val, exc_tb):
-        await self.close()
-
     async def health_check(self) -> bool:
         """Проверка работоспособности сервиса"""
+        # Проба идет мимо кэша тональности, иначе сбой API не будет заметен
+        if _SENTIMENT_BREAKER.is_open:
+            return False
         try:
-            result = await self.analyze_sentiment("This is a test message")
-            return result != "unknown"
+            response_data = await self.send_request("This is a test message")
+            return response_data.get("sentiment", "").lower() in ("positive", "negative", "neutral")
         except Exception:
             return False
 
 
+_SENTIMENT_SERVICE: Optional[SentimentService] = None
+
+
 def get_sentiment_service() -> SentimentService:
-    return SentimentService()
+    global _SENTIMENT_SERVICE
+    if _SENTIMENT_SERVICE is None:
+        _SENTIMENT_SERVICE = SentimentService()
+    return _SENTIMENT_SERVICE
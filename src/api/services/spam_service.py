@@ -1,50 +1,57 @@
+import asyncio
 import logging
-from typing import Optional
+from typing import Any, Dict, Optional
+from cachetools import TTLCache
+from core.cache import make_text_cache_key
 from core.config import settings
+from core.http import get_http_session
+from core.resilience import CircuitBreaker, with_retry
 import aiohttp
+import orjson
 
-logger = logging.Logger(__name__)
+logger = logging.getLogger(__name__)
+
+# Кэш результатов проверки на спам по хэшу нормализованного текста
+_SPAM_CACHE: TTLCache = TTLCache(maxsize=10_000, ttl=24 * 60 * 60)
+
+# Не больше стольких одновременных запросов к Spam API
+SPAM_SEM = asyncio.Semaphore(5)
+
+# Размыкается после серии сбоев Spam API, пока он недоступен жалобы не ждут проверку
+_SPAM_BREAKER = CircuitBreaker("spam-api")
 
 
 class SpamService:
     def __init__(self):
         self.url = settings.optional_api_settings.spam_api_url
         self.api_key = settings.optional_api_settings.spam_api_key
-        self.timeout = 5
-        self._session: Optional[aiohttp.ClientSession] = None
+        self.timeout = aiohttp.ClientTimeout(total=5)
+        self._headers = {
+            "apikey": self.api_key
+        }
 
     async def get_session(self) -> aiohttp.ClientSession:
-        """Получение HTTP сессии"""
-        if self._session is None or self._session.closed:
-            timeout = aiohttp.ClientTimeout(total=self.timeout)
-            self._session = aiohttp.ClientSession(timeout=timeout)
-        return self._session
-
-
-    async def check_spam(self, text: str) -> bool:
-        if not self.api_key:
-            logger.warning("Spam API key not configured")
-            return False
+        """Получение общей HTTP сессии"""
+        return get_http_session()
 
-        try:
-            session = await self.get_session()
 
-            headers = {
-                "apikey": self.api_key
-            }
+    @with_retry()
+    async def send_request(self, text: str) -> Dict[str, Any]:
+        session = await self.get_session()
 
-            payload = {
-                "text": text.strip()
-            }
+        payload = {
+            "text": text.strip()
+        }
 
-            async with session.post(self.url, headers=headers, json=payload, ssl=False) as response:
-                response_text = await response.text()
+        async with SPAM_SEM:
+            async with session.post(self.url, headers=self._headers, json=payload, ssl=False, timeout=self.timeout) as response:
+                body = await response.read()
 
                 if response.status == 200:
                     try:
-                        data = await response.json() if response_text else {}
-                        logger.info(f"Успех Spam API: {data}")
-                        return data.get("is_spam")
+                        data = orjson.loads(body) if body else {}
+                        logger.info("Успех Spam API: %s", data)
+                        return data
                     except Exception as e:
                         logger.error(f"Не удалось проанализировать ответ JSON: {e}")
                         raise aiohttp.ClientResponseError(
@@ -53,15 +60,53 @@ class SpamService:
                             status=response.status,
                             message="Неверный ответ JSON"
                         )
+
+                error_text = body.decode(errors="replace")
+                logger.error("Spam API error %d: %s", response.status, error_text)
+                raise aiohttp.ClientResponseError(
+                    request_info=response.request_info,
+                    history=response.history,
+                    status=response.status,
+                    message=error_text
+                )
+
+    async def check_spam(self, text: str) -> bool:
+        if not self.api_key:
+            logger.warning("Spam API key not configured")
+            return False
+
+        cache_key = make_text_cache_key(text, lowercase=False)
+        cached_is_spam = _SPAM_CACHE.get(cache_key)
+        if cached_is_spam is not None:
+            return cached_is_spam
+        if not _SPAM_BREAKER.allow():
+            return False
+
+        try:
+            data = await self.send_request(text)
+        except aiohttp.ClientResponseError as e:
+            if e.status == 429 or 500 <= e.status < 600:
+                _SPAM_BREAKER.record_failure()
+            # Ответ с ошибкой: спам не определен
+            logger.error(f"Error in spam check: {e}")
+            return None
         except Exception as e:
+            _SPAM_BREAKER.record_failure()
             logger.error(f"Error in spam check: {e}")
             return False
 
-    async def close(self):
-        """Закрытие HTTP сессии"""
-        if self._session and not self._session.closed:
-            await self._session.close()
+        _SPAM_BREAKER.record_success()
+        is_spam = data.get("is_spam")
+        if is_spam is not None:
+            _SPAM_CACHE[cache_key] = is_spam
+        return is_spam
+
+
+_SPAM_SERVICE: Optional[SpamService] = None
 
 
 def get_spam_service() -> SpamService:
-    return SpamService()
\ No newline at end of file
+    global _SPAM_SERVICE
+    if _SPAM_SERVICE is None:
+        _SPAM_SERVICE = SpamService()
+    return _SPAM_SERVICE
@@ -1,13 +1,21 @@
+import asyncio
 import logging
 from datetime import datetime
 
 from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse
 from starlette.middleware.cors import CORSMiddleware
 from sqlalchemy import text
 from core.config import settings
 from middleware.geo_middleware import GeolocationMiddleware, IPMiddleware
 from api.controllers.complaints_controller import router as complaints_router
-from database.session import engine
+from api.dto.complaints_dto import warm_up_schemas
+from api.repositories.complaints_repository import close_insert_batcher
+from api.services.ai_service import get_ai_service, close_ai_service
+from api.services.location_service import get_location_service, close_location_service
+from api.services.sentiment_service import get_sentiment_service
+from core.http import init_http_session, close_http_session
+from database.session import engine, get_session, warm_up_pool
 from models.complaint_model import Base
 
 logging.basicConfig(
@@ -22,7 +30,8 @@ app = FastAPI(
     version="1.0.0",
     debug=settings.app_settings.debug,
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    default_response_class=ORJSONResponse
 )
 
 # Middleware (порядок важен!)
@@ -43,11 +52,20 @@ app.include_router(complaints_router)
 @app.on_event("startup")
 async def startup_event():
     try:
-        # Создание таблиц в базе данных
-        async with engine.begin() as conn:
-            await conn.run_sync(Base.metadata.create_all)
+        # Схема создается миграциями (python -m alembic upgrade head), create_all оставлен для локальной отладки
+        if settings.app_settings.debug:
+            async with engine.begin() as conn:
+                await conn.run_sync(Base.metadata.create_all)
+
+            logger.info("Database tables created successfully")
+
+        await warm_up_pool()
+
+        await init_http_session()
+
+        # Прогрев схем pydantic, чтобы первый запрос не платил за их сборку
+        warm_up_schemas()
 
-        logger.info("Database tables created successfully")
         logger.info(f"Application started successfully on {settings.app_settings.host}:{settings.app_settings.port}")
 
     except Exception as e:
@@ -59,6 +77,10 @@ async def startup_event():
 async def shutdown_event():
     """Очистка ресурсов при остановке приложения"""
     try:
+        await close_insert_batcher()
+        await close_ai_service()
+        await close_location_service()
+        await close_http_session()
         await engine.dispose()
         logger.info("Application shutdown completed")
 
@@ -76,6 +98,37 @@ async def root():
     }
 
 
+# Ограничение на время одной проверки, чтобы /health не зависал на медленном внешнем API
+HEALTH_CHECK_TIMEOUT = 2
+
+
+async def _check_database() -> bool:
+    async for session in get_session():
+        await session.execute(text("SELECT 1"))
+    return True
+
+
+async def _check_sentiment() -> bool:
+    return await get_sentiment_service().health_check()
+
+
+async def _check_openai() -> bool:
+    return await get_ai_service().health_check()
+
+
+async def _check_geolocation() -> bool:
+    return await get_location_service().health_check()
+
+
+# (сервис, проверка, статус при сбое, переводит ли сбой всю систему в degraded)
+_HEALTH_CHECKS = (
+    ("database", _check_database, "unhealthy", True),
+    ("sentiment_api", _check_sentiment, "unhealthy", True),
+    ("openai_api", _check_openai, "unhealthy", True),
+    ("geolocation_api", _check_geolocation, "degraded", False),
+)
+
+
 @app.get("/health", tags=["Health"])
 async def health_check():
     """
@@ -87,56 +140,23 @@ async def health_check():
         "services": {}
     }
 
-    # Проверка базы данных
-    try:
-        from database.session import get_session
-        async for session in get_session():
-            await session.execute(text("SELECT 1"))
-        health_status["services"]["database"] = "healthy"
-    except Exception as e:
-        health_status["services"]["database"] = f"unhealthy: {str(e)}"
-        health_status["status"] = "degraded"
-
-    # Проверка Sentiment API
-    try:
-        from api.services.sentiment_service import SentimentService
-        sentiment_service = SentimentService()
-        if await sentiment_service.health_check():
-            health_status["services"]["sentiment_api"] = "healthy"
+    # Все проверки идут параллельно, общее время ограничено самой долгой из них
+    results = await asyncio.gather(
+        *(asyncio.wait_for(check(), timeout=HEALTH_CHECK_TIMEOUT) for _, check, _, _ in _HEALTH_CHECKS),
+        return_exceptions=True
+    )
+
+    for (service_name, _, failed_status, critical), result in zip(_HEALTH_CHECKS, results):
+        if isinstance(result, BaseException):
+            error = "timeout" if isinstance(result, asyncio.TimeoutError) else str(result)
+            health_status["services"][service_name] = f"{failed_status}: {error}"
+        elif result:
+            health_status["services"][service_name] = "healthy"
+            continue
         else:
-            health_status["services"]["sentiment_api"] = "unhealthy"
-            health_status["status"] = "degraded"
-        await sentiment_service.close()
-    except Exception as e:
-        health_status["services"]["sentiment_api"] = f"unhealthy: {str(e)}"
-        health_status["status"] = "degraded"
+            health_status["services"][service_name] = failed_status
 
-    # Проверка OpenAI API
-    try:
-        from api.services.ai_service import AIService, get_ai_service
-        ai_service = get_ai_service()
-        if await ai_service.health_check():
-            health_status["services"]["openai_api"] = "healthy"
-        else:
-            health_status["services"]["openai_api"] = "unhealthy"
+        if critical:
             health_status["status"] = "degraded"
-        await ai_service.close()
-    except Exception as e:
-        health_status["services"]["openai_api"] = f"unhealthy: {str(e)}"
-        health_status["status"] = "degraded"
-
-    # Проверка геолокации
-    try:
-        from api.services.location_service import LocationService
-        location_service = LocationService()
-        test_location = await location_service.get_location("8.8.8.8")  # Google DNS
-        if test_location:
-            health_status["services"]["geolocation_api"] = "healthy"
-        else:
-            health_status["services"]["geolocation_api"] = "degraded"
-        await location_service.close()
-    except Exception as e:
-        health_status["services"]["geolocation_api"] = f"degraded: {str(e)}"
 
     return health_status
-
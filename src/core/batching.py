@@ -0,0 +1,111 @@
+import asyncio
+from abc import ABC, abstractmethod
+from typing import Any, List, Optional, Set, Tuple
+
+
+class MicroBatcher(ABC):
+    """Собирает одновременные вызовы в пачки по размеру или по временному окну"""
+
+    def __init__(self, max_size: int, window_ms: int):
+        self.max_size = max_size
+        self.window = window_ms / 1000
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._worker: Optional[asyncio.Task] = None
+        self._pending: Set[asyncio.Task] = set()
+
+    @abstractmethod
+    async def process(self, items: List[Any]) -> List[Any]:
+        """Обработка пачки, результаты возвращаются в порядке элементов.
+
+        Исключение на месте результата уходит только вызову этого элемента.
+        """
+
+    async def submit(self, item: Any) -> Any:
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((item, future))
+
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.create_task(self._run())
+
+        return await future
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        batch: List[Tuple[Any, asyncio.Future]] = []
+
+        try:
+            while True:
+                batch = [await self._queue.get()]
+                deadline = loop.time() + self.window
+
+                # Пока предыдущая пачка в работе, вызовы копятся в течение окна;
+                # в простое готовая пачка уходит сразу, как только очередь опустела
+                while len(batch) < self.max_size:
+                    if not self._queue.empty():
+                        batch.append(self._queue.get_nowait())
+                        continue
+                    if not self._pending:
+                        # Даем встать в очередь вызовам, уже готовым к запуску
+                        await asyncio.sleep(0)
+                        if self._queue.empty():
+                            break
+                        continue
+                    remaining = deadline - loop.time()
+                    if remaining <= 0:
+                        break
+                    try:
+                        batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+                    except asyncio.TimeoutError:
+                        break
+
+                # Пачка обрабатывается отдельной задачей, чтобы не задерживать сбор следующей
+                task = asyncio.create_task(self._dispatch(batch))
+                self._pending.add(task)
+                task.add_done_callback(self._pending.discard)
+                batch = []
+        except asyncio.CancelledError:
+            self._fail(batch, RuntimeError(f"{type(self).__name__} closed"))
+            raise
+
+    async def _dispatch(self, batch: List[Tuple[Any, asyncio.Future]]):
+        try:
+            results = await self.process([item for item, _ in batch])
+        except asyncio.CancelledError:
+            self._fail(batch, RuntimeError(f"{type(self).__name__} closed"))
+            raise
+        except Exception as e:
+            self._fail(batch, e)
+            return
+
+        for (_, future), result in zip(batch, results):
+            if future.done():
+                continue
+            if isinstance(result, BaseException):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+        if len(results) != len(batch):
+            self._fail(
+                batch[len(results):],
+                RuntimeError(f"{type(self).__name__} returned {len(results)} results for {len(batch)} items")
+            )
+
+    @staticmethod
+    def _fail(batch: List[Tuple[Any, asyncio.Future]], error: BaseException):
+        for _, future in batch:
+            if not future.done():
+                future.set_exception(error)
+
+    async def close(self):
+        tasks = list(self._pending)
+        if self._worker is not None:
+            tasks.append(self._worker)
+            self._worker = None
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+        # Вызовы, которые так и не попали в пачку
+        while not self._queue.empty():
+            self._fail([self._queue.get_nowait()], RuntimeError(f"{type(self).__name__} closed"))
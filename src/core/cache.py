@@ -0,0 +1,22 @@
+import asyncio
+import hashlib
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+
+def make_text_cache_key(text: str, lowercase: bool = True) -> bytes:
+    """Ключ кэша по нормализованному тексту (пробелы схлопываются, регистр опционально)"""
+    normalized = " ".join(text.split())
+    if lowercase:
+        normalized = normalized.lower()
+    return hashlib.blake2b(normalized.encode(), digest_size=16).digest()
+
+
+async def single_flight(inflight: Dict[Hashable, asyncio.Task], key: Hashable, factory: Callable[[], Awaitable[Any]]) -> Any:
+    """Одновременные вызовы с одним ключом ждут результат одного и того же вызова factory"""
+    task = inflight.get(key)
+    if task is None:
+        task = asyncio.ensure_future(factory())
+        inflight[key] = task
+        task.add_done_callback(lambda done: inflight.pop(key, None) if inflight.get(key) is done else None)
+    # shield: отмена одного из ожидающих не отменяет общий вызов для остальных
+    return await asyncio.shield(task)
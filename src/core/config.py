@@ -1,13 +1,19 @@
 import os
+from functools import lru_cache
 
+from dotenv import dotenv_values
 from pydantic_settings import BaseSettings, SettingsConfigDict
 from pydantic import Field
 
 BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '../../'))
+ENV_FILE = os.path.join(BASE_DIR, ".env")
 
 
 class DBSettings(BaseSettings):
     name: str = Field("complaints.db", validation_alias='DB_NAME')
+    pool_size: int = Field(20, validation_alias='DB_POOL_SIZE')
+    max_overflow: int = Field(10, validation_alias='DB_MAX_OVERFLOW')
+    pool_recycle: int = Field(1800, validation_alias='DB_POOL_RECYCLE')
 
     @property
     def uri(self) -> str:
@@ -59,6 +65,7 @@ class OptionalAPISettings(BaseSettings):
     spam_api_url: str = Field("https://api.apilayer.com/spamchecker?threshold=3", validation_alias='SPAM_API_URL')
 
     ip_api_url: str = Field("http://ip-api.com/json", validation_alias='IP_API_URL')
+    ip_api_batch_url: str = Field("http://ip-api.com/batch", validation_alias='IP_API_BATCH_URL')
 
     model_config = SettingsConfigDict(env_file=".env", env_file_encoding='utf-8', extra='ignore')
 
@@ -76,15 +83,43 @@ class AppSettings(BaseSettings):
 
 
 class Settings(BaseSettings):
-    db_settings: DBSettings = DBSettings()
-    sentiment_api_settings: SentimentAPISettings = SentimentAPISettings()
-    openai_settings: OpenAISettings = OpenAISettings()
-    telegram_settings: TelegramSettings = TelegramSettings()
-    google_sheets_settings: GoogleSheetsSettings = GoogleSheetsSettings()
-    optional_api_settings: OptionalAPISettings = OptionalAPISettings()
-    app_settings: AppSettings = AppSettings()
+    # Вложенные настройки создаются при создании Settings, а не при импорте модуля
+    db_settings: DBSettings = Field(default_factory=DBSettings)
+    sentiment_api_settings: SentimentAPISettings = Field(default_factory=SentimentAPISettings)
+    openai_settings: OpenAISettings = Field(default_factory=OpenAISettings)
+    telegram_settings: TelegramSettings = Field(default_factory=TelegramSettings)
+    google_sheets_settings: GoogleSheetsSettings = Field(default_factory=GoogleSheetsSettings)
+    optional_api_settings: OptionalAPISettings = Field(default_factory=OptionalAPISettings)
+    app_settings: AppSettings = Field(default_factory=AppSettings)
 
     model_config = SettingsConfigDict(env_file=".env", env_file_encoding='utf-8', extra='ignore')
 
 
-settings = Settings(_env_file=f"{BASE_DIR}/.env", _env_file_encoding='utf-8')
\ No newline at end of file
+def _read_env_file() -> dict:
+    """Значения из .env, которые не переопределены переменными окружения"""
+    environ_keys = {key.upper() for key in os.environ}
+    return {
+        key.upper(): value
+        for key, value in dotenv_values(ENV_FILE, encoding='utf-8').items()
+        if value is not None and key.upper() not in environ_keys
+    }
+
+
+@lru_cache(maxsize=1)
+def get_settings() -> Settings:
+    # .env разбирается один раз и передается во все вложенные настройки;
+    # их собственное чтение файла отключено, переменные окружения по-прежнему в приоритете
+    env_values = _read_env_file()
+    return Settings(
+        _env_file=None,
+        db_settings=DBSettings(_env_file=None, **env_values),
+        sentiment_api_settings=SentimentAPISettings(_env_file=None, **env_values),
+        openai_settings=OpenAISettings(_env_file=None, **env_values),
+        telegram_settings=TelegramSettings(_env_file=None, **env_values),
+        google_sheets_settings=GoogleSheetsSettings(_env_file=None, **env_values),
+        optional_api_settings=OptionalAPISettings(_env_file=None, **env_values),
+        app_settings=AppSettings(_env_file=None, **env_values),
+    )
+
+
+settings = get_settings()
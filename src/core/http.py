@@ -0,0 +1,44 @@
+from typing import Optional
+
+import aiohttp
+import orjson
+
+# Общая HTTP сессия процесса: keep-alive соединения переиспользуются всеми сервисами
+session: Optional[aiohttp.ClientSession] = None
+
+
+def _json_serialize(value) -> str:
+    # aiohttp ожидает от json_serialize строку, которую сам кодирует в utf-8
+    return orjson.dumps(value).decode()
+
+
+def _create_session() -> aiohttp.ClientSession:
+    connector = aiohttp.TCPConnector(
+        limit=0,
+        limit_per_host=64,
+        ttl_dns_cache=300,
+        keepalive_timeout=30,
+        enable_cleanup_closed=True
+    )
+    return aiohttp.ClientSession(connector=connector, json_serialize=_json_serialize)
+
+
+async def init_http_session():
+    global session
+    if session is None or session.closed:
+        session = _create_session()
+
+
+def get_http_session() -> aiohttp.ClientSession:
+    """Общая сессия; создается лениво, если приложение стартовало без init_http_session"""
+    global session
+    if session is None or session.closed:
+        session = _create_session()
+    return session
+
+
+async def close_http_session():
+    global session
+    if session is not None and not session.closed:
+        await session.close()
+    session = None
@@ -0,0 +1,84 @@
+import asyncio
+import functools
+import logging
+import random
+import time
+from typing import Optional
+
+import aiohttp
+
+logger = logging.getLogger(__name__)
+
+
+def is_retryable_error(error: BaseException) -> bool:
+    """Повторять имеет смысл только временные сбои: тайм-ауты, обрывы соединения и 5xx"""
+    if isinstance(error, (asyncio.TimeoutError, aiohttp.ServerConnectionError)):
+        return True
+    return isinstance(error, aiohttp.ClientResponseError) and 500 <= error.status < 600
+
+
+def with_retry(attempts: int = 3, base_delay: float = 0.1, max_delay: float = 2.0):
+    """Повтор async функции с экспоненциальной задержкой и случайным разбросом"""
+
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            for attempt in range(1, attempts + 1):
+                try:
+                    return await func(*args, **kwargs)
+                except Exception as e:
+                    if attempt == attempts or not is_retryable_error(e):
+                        raise
+                    delay = min(max_delay, base_delay * 2 ** (attempt - 1)) + random.uniform(0, base_delay)
+                    logger.warning(
+                        "%s failed (attempt %d/%d), retrying in %.2fs: %s",
+                        func.__qualname__, attempt, attempts, delay, e
+                    )
+                    await asyncio.sleep(delay)
+
+        return wrapper
+
+    return decorator
+
+
+class CircuitBreaker:
+    """После серии сбоев подряд перестает пускать вызовы к сервису на reset_after секунд"""
+
+    def __init__(self, name: str, fail_threshold: int = 5, reset_after: float = 30):
+        self.name = name
+        self.fail_threshold = fail_threshold
+        self.reset_after = reset_after
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._trial_started_at: Optional[float] = None
+
+    @property
+    def is_open(self) -> bool:
+        """Цепь разомкнута и пауза еще не истекла (проверка без занятия пробного вызова)"""
+        return self._opened_at is not None and time.monotonic() - self._opened_at < self.reset_after
+
+    def allow(self) -> bool:
+        if self._opened_at is None:
+            return True
+        now = time.monotonic()
+        if now - self._opened_at < self.reset_after:
+            return False
+        # По истечении паузы пропускаем один пробный вызов, остальные ждут его результата;
+        # если результат так и не записали, через reset_after пропускается следующий
+        if self._trial_started_at is not None and now - self._trial_started_at < self.reset_after:
+            return False
+        self._trial_started_at = now
+        return True
+
+    def record_success(self):
+        self._failures = 0
+        self._opened_at = None
+        self._trial_started_at = None
+
+    def record_failure(self):
+        self._failures += 1
+        if self._failures >= self.fail_threshold:
+            if self._opened_at is None:
+                logger.warning("Circuit breaker '%s' opened after %d failures", self.name, self._failures)
+            self._opened_at = time.monotonic()
+            self._trial_started_at = None
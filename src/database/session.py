@@ -1,12 +1,19 @@
+import asyncio
+
+from sqlalchemy import event
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
-from sqlalchemy.pool import StaticPool
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 from core.config import settings
 
 engine = create_async_engine(
     settings.db_settings.uri,
     echo=settings.app_settings.debug,
 
-    poolclass=StaticPool,
+    poolclass=AsyncAdaptedQueuePool,
+    pool_size=settings.db_settings.pool_size,
+    max_overflow=settings.db_settings.max_overflow,
+    pool_pre_ping=False,
+    pool_recycle=settings.db_settings.pool_recycle,
     connect_args={
         "check_same_thread": False,
     },
@@ -14,6 +21,24 @@ engine = create_async_engine(
     future=True
 )
 
+# Настройки SQLite для каждого нового соединения: WAL позволяет читать параллельно с записью
+SQLITE_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA mmap_size=268435456",
+    "PRAGMA cache_size=-64000",
+)
+
+
+@event.listens_for(engine.sync_engine, "connect")
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    for pragma in SQLITE_PRAGMAS:
+        cursor.execute(pragma)
+    cursor.close()
+
+
 async_session_maker = async_sessionmaker(
     bind=engine,
     class_=AsyncSession,
@@ -23,6 +48,13 @@ async_session_maker = async_sessionmaker(
 )
 
 
+async def warm_up_pool(size: int = settings.db_settings.pool_size):
+    """Заполнение пула соединений при старте, чтобы первые запросы не открывали их сами"""
+    connections = await asyncio.gather(*(engine.connect() for _ in range(size)))
+    for connection in connections:
+        await connection.close()
+
+
 async def get_session() -> AsyncSession:
     async with async_session_maker() as session:
         try:
@@ -1,73 +1,110 @@
-from fastapi import Request, Response
-from starlette.middleware.base import BaseHTTPMiddleware
-from starlette.types import ASGIApp
+from fastapi import Request
+from starlette.types import ASGIApp, Receive, Scope, Send
+from api.services.location_service import get_location_service, is_routable_ip
+import asyncio
 import logging
 from typing import Optional
 
 logger = logging.getLogger(__name__)
 
 
-class IPMiddleware(BaseHTTPMiddleware):
+class IPMiddleware:
+    # Имена заголовков в порядке приоритета, в том виде, в котором их отдает ASGI сервер
+    headers_to_check = (
+        b"x-forwarded-for",
+        b"x-real-ip",
+        b"cf-connecting-ip",
+        b"x-client-ip"
+    )
+    header_keys = frozenset(headers_to_check)
+
     def __init__(self, app: ASGIApp):
-        super().__init__(app)
+        self.app = app
+
+    def extract_client_ip(self, scope: Scope) -> Optional[str]:
+        # Один проход по заголовкам; приоритет учитывается только среди найденных
+        found = {}
+        for name, value in scope["headers"]:
+            if name in self.header_keys and value and name not in found:
+                found[name] = value
 
-    def extract_client_ip(self, request: Request) -> Optional[str]:
-        headers_to_check = [
-            "x-forwarded-for",
-            "x-real-ip",
-            "cf-connecting-ip",
-            "x-client-ip"
-        ]
+        if found:
+            for header in self.headers_to_check:
+                value = found.get(header)
+                if value:
+                    # Берем первый IP из списка (в случае X-Forwarded-For)
+                    return value.split(b',', 1)[0].strip().decode('latin-1')
 
-        for header in headers_to_check:
-            ip = request.headers.get(header)
-            if ip:
-                # Берем первый IP из списка (в случае X-Forwarded-For)
-                return ip.split(',')[0].strip()
+        client = scope.get("client")
+        return client[0] if client else None
 
-        return request.client.host if request.client else None
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
 
-    async def dispatch(self, request: Request, call_next) -> Response:
-        client_ip = self.extract_client_ip(request)
+        client_ip = self.extract_client_ip(scope)
 
-        # Добавляем IP в state запроса
-        request.state.client_ip = client_ip
+        # Добавляем IP в state запроса (request.state читает scope["state"])
+        scope.setdefault("state", {})["client_ip"] = client_ip
 
         # Логируем для отладки
         if client_ip:
-            logger.debug(f"Request from IP: {client_ip} to {request.url.path}")
+            logger.debug("Request from IP: %s to %s", client_ip, scope["path"])
         else:
-            logger.warning(f"Could not determine client IP for {request.url.path}")
+            logger.warning("Could not determine client IP for %s", scope["path"])
 
         # Продолжаем обработку запроса
-        response = await call_next(request)
-
-        return response
+        await self.app(scope, receive, send)
 
 
-class GeolocationMiddleware(BaseHTTPMiddleware):
+class GeolocationMiddleware:
 
     def __init__(self, app: ASGIApp, enable_geolocation: bool = True):
-        super().__init__(app)
+        self.app = app
         self.enable_geolocation = enable_geolocation
         self._location_service = None
+        # Ссылки на фоновые задачи, чтобы их не собрал сборщик мусора
+        self._tasks = set()
 
     @property
     def location_service(self):
         if self._location_service is None:
-            from api.services.location_service import LocationService
-            self._location_service = LocationService()
+            self._location_service = get_location_service()
         return self._location_service
 
-    async def dispatch(self, request: Request, call_next) -> Response:
+    async def detect_location(self, client_ip: str) -> Optional[str]:
         try:
-            location = await self.location_service.get_location(request.state.client_ip)
-            request.state.client_location = location
-            logger.info(f"Location detected for {request.state.client_ip}: {location}")
+            location = await self.location_service.get_location(client_ip)
+            logger.info("Location detected for %s: %s", client_ip, location)
+            return location
         except Exception as e:
             logger.error(f"Geolocation failed: {e}")
-            request.state.client_location = None
+            return None
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        state = scope.setdefault("state", {})
+        client_ip = state.get("client_ip")
+
+        if self.enable_geolocation and is_routable_ip(client_ip):
+            # Геолокация идет в фоне: ждут ее только обработчики, которым она нужна
+            task = asyncio.create_task(self.detect_location(client_ip))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+            state["client_location"] = task
+        else:
+            state["client_location"] = None
+
+        await self.app(scope, receive, send)
 
-        response = await call_next(request)
 
-        return response
\ No newline at end of file
+async def get_client_location(request: Request) -> Optional[str]:
+    """Зависимость: дожидается фонового определения геолокации клиента"""
+    location = getattr(request.state, 'client_location', None)
+    if isinstance(location, asyncio.Task):
+        return await location
+    return location
@@ -1,6 +1,6 @@
 from datetime import datetime
 
-from sqlalchemy import Integer, Column, Enum, Text, String, DateTime, Boolean
+from sqlalchemy import Integer, Column, Enum, Text, String, DateTime, Boolean, Index
 from src.database.base import Base
 
 
@@ -16,3 +16,8 @@ class Complaint(Base):
 
     is_spam = Column(Boolean)
     ip_location = Column(String(100))
+
+    # Составной индекс под фильтрацию и сортировку в списке жалоб
+    __table_args__ = (
+        Index("ix_complaints_filters", status, category, sentiment, timestamp.desc()),
+    )
@@ -8,5 +8,8 @@ echo "  HOST: ${HOST:-0.0.0.0}"
 echo "  PORT: ${PORT:-8000}"
 echo "  DEBUG: ${DEBUG:-false}"
 
+echo "🗄️ Applying database migrations..."
+python -m alembic upgrade head
+
 echo "🎯 Starting API server..."
-uvicorn src.api_app:app --host 0.0.0.0 --port 8000
\ No newline at end of file
+uvicorn src.api_app:app --host 0.0.0.0 --port 8000 --loop uvloop --http httptools
\ No newline at end of file